@@ -1,177 +1,195 @@
-from flask import Flask, render_template, request, jsonify, Response
+from quart import Quart, request, jsonify, Response
+from quart.json.provider import DefaultJSONProvider
+import asyncio
+import atexit
+import brotli
+import gzip
+import hashlib
 import logging
-import json
-from rich.console import Console
-from rich.logging import RichHandler
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+import queue
 import os
-import glob
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
 
-# Install rich traceback handler
-from rich.traceback import install
+# Install rich traceback handler in development only; show_locals makes every
+# traceback repr the locals of every frame
+if os.environ.get("QUART_ENV") == "development":
+    from rich.traceback import install
+    install(show_locals=True)
 
-install(show_locals=True)
 
-# Initialize Rich console
-console = Console()
+class StripMarkupFilter(logging.Filter):
+    """Drop the Rich style tags (e.g. [cyan]...[/cyan]) from a record's message template.
+
+    Only record.msg is rewritten, before the record is formatted, so the
+    interpolated args and the traceback keep their brackets.
+    """
+
+    STYLES = "bold|italic|dim|underline"
+    COLORS = "red|green|yellow|blue|magenta|purple|cyan|white"
+    MARKUP_PATTERN = re.compile(
+        rf"\[/?(?:(?:{STYLES}) )?(?:{COLORS})\]|\[/?(?:{STYLES})\]")
+
+    def filter(self, record):
+        if isinstance(record.msg, str):
+            record.msg = self.MARKUP_PATTERN.sub("", record.msg)
+        return True
+
+
+# Configure logging: Rich styling only on an interactive terminal, plain
+# lines otherwise. Records go through a queue so request handlers never wait
+# on the handler's formatting or writes. QueueHandler formats each record
+# (traceback included) before queueing it and drops exc_info, so Rich
+# tracebacks can't apply here.
+queue_handler = QueueHandler(queue.SimpleQueue())
+if sys.stderr.isatty():
+    from rich.logging import RichHandler
+    log_handler = RichHandler(markup=True)
+else:
+    log_handler = logging.StreamHandler()
+    log_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    queue_handler.addFilter(StripMarkupFilter())
+log_listener = QueueListener(queue_handler.queue, log_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
 
-# Configure logging with Rich handler
 logging.basicConfig(level=logging.INFO,
                     format="%(message)s",
-                    handlers=[RichHandler(rich_tracebacks=True, markup=True)])
+                    handlers=[queue_handler])
 logger = logging.getLogger("main_script")
 
-# Flask app initialization
-app = Flask(__name__)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson instead of the stdlib."""
+
+    def dumps(self, obj, **kwargs):
+        # orjson always writes compact UTF-8, so the indent/separators/
+        # ensure_ascii options of the default provider are ignored.
+        return orjson.dumps(obj,
+                            default=self.default,
+                            option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+# Quart (ASGI) app initialization. The page has no static assets, so no
+# /static route is registered.
+app = Quart(__name__, static_folder=None)
+app.json = OrjsonProvider(app)
+# Serve /process/ as /process instead of answering it with a redirect
+app.url_map.strict_slashes = False
 
 # Import step functions
 from step_1 import main as step_1_main
-from step_2 import main as step_2_main
-from step_3 import main as step_3_main
+from step_2 import main as step_2_main, load_dataset
+from step_3 import main as step_3_main, NoMatchesError
 from step_4 import main as step_4_main
 
 
-def execute_with_timeout(func, timeout, *args, **kwargs):
-    """Run a function with a timeout to prevent hangs."""
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        future = executor.submit(func, *args, **kwargs)
-        try:
-            return future.result(timeout=timeout)
-        except TimeoutError:
-            future.cancel()
-            logger.error("Timeout occurred during execution.")
-            raise TimeoutError(
-                f"Execution of {func.__name__} exceeded {timeout} seconds.")
+def call_step(func, *args, **kwargs):
+    """Call a step in its worker thread, turning its exit(1) into an exception."""
+    try:
+        return func(*args, **kwargs)
+    except SystemExit:
+        # The step scripts call exit(1) on failure. Convert it here, in the
+        # worker thread: a SystemExit raised inside the wait_for task would
+        # reach the event loop and shut down the whole server.
+        raise RuntimeError(f"{func.__name__} exited before completing.")
+
+
+async def run_step(func, timeout, *args, **kwargs):
+    """Run a blocking step function off the event loop, with an optional timeout."""
+    try:
+        return await asyncio.wait_for(
+            asyncio.to_thread(call_step, func, *args, **kwargs),
+            timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.error("Timeout occurred during execution.")
+        raise TimeoutError(
+            f"Execution of {func.__name__} exceeded {timeout} seconds.")
+
+
+def sse_event(obj) -> bytes:
+    """Serialize one server-sent event of the /process stream."""
+    return b"data: " + app.json.dumps(obj).encode() + b"\n\n"
+
+
+async def gzip_stream(chunks):
+    """Gzip an async byte stream, flushing at each line end so events aren't held back."""
+    compressor = zlib.compressobj(5, zlib.DEFLATED, 31)  # wbits=31: gzip framing
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if chunk.endswith(b"\n"):
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def minify_html(html: str) -> str:
+    """Drop CSS comments and line indentation from a page; scripts keep their comments."""
+    html = re.sub(r"<style>.*?</style>",
+                  lambda m: re.sub(r"\s*/\*.*?\*/", "", m.group(0), flags=re.S),
+                  html,
+                  flags=re.S)
+    return re.sub(r"\n\s+", "\n", html)
+
+
+# The page is static, so it is read and minified once at import and served
+# from memory
+INDEX_BYTES = minify_html(
+    (Path(__file__).parent / 'templates' /
+     'index.html').read_text(encoding='utf-8')).encode('utf-8')
+INDEX_ETAG = hashlib.md5(INDEX_BYTES).hexdigest()
+# Precompressed variants of the page, keyed by Content-Encoding
+INDEX_ENCODINGS = {
+    'br': brotli.compress(INDEX_BYTES, quality=11),
+    'gzip': gzip.compress(INDEX_BYTES, 9),
+}
 
 
 @app.route('/')
-def index():
-    return '''
-<!doctype html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Chasiddus AI</title>
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; }
-        h1 { color: #333; text-align: center; font-size: 36px; margin-bottom: 10px; }
-        h2 { color: #666; text-align: center; font-size: 18px; margin-bottom: 30px; }
-        form { margin-bottom: 20px; display: flex; justify-content: center; align-items: center; gap: 10px; }
-        input[type="text"] {
-            padding: 10px;
-            width: 300px;
-            border: 1px solid #ccc;
-            border-radius: 5px;
-            font-size: 16px;
-        }
-        button {
-            padding: 10px 20px;
-            border: none;
-            border-radius: 5px;
-            background-color: #4CAF50;
-            color: white;
-            font-size: 16px;
-            cursor: pointer;
-        }
-        button:hover {
-            background-color: #45a049;
-        }
-        .result-container { margin-top: 20px; }
-        .card { background: #fff; border-radius: 10px; padding: 15px; margin-bottom: 10px; box-shadow: 0 2px 5px rgba(0, 0, 0, 0.1); }
-        .card p { direction: rtl; text-align: right; }
-        .card h3 { margin: 0; padding-bottom: 10px; border-bottom: 1px solid #ddd; direction: rtl; text-align: right; }
-        .expand-btn { color: blue; cursor: pointer; }
-        .hidden { display: none; }
-        .spinner {
-            border: 4px solid #f3f3f3; /* צבע רקע */
-            border-top: 4px solid #4CAF50; /* צבע החלק המסתובב */
-            border-radius: 50%;
-            width: 40px;
-            height: 40px;
-            animation: spin 1s linear infinite;
-            margin: auto;
-        }
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
-        .card .full-text {
-            direction: rtl; /* כיוון הטקסט */
-            text-align: justify; /* יישור הטקסט */
-            line-height: 1.8; /* מרווח בין שורות */
-            margin: 10px 0; /* מרווח בין פסקאות */
-            padding: 10px; /* מרווח פנימי */
-            background-color: #f9f9f9; /* רקע בהיר */
-            border: 1px solid #ddd; /* מסגרת */
-            border-radius: 5px; /* פינות מעוגלות */
-            font-size: 16px; /* גודל הטקסט */
-        }
-    </style>
-</head>
-<body>
-    <h1>Chasiddus AI</h1>
-    <h2>Search for any Dvar Torah in Chasidishe Seforim using AI. This version has access to the entire Divrey Yoel.</h2>
-    <form id="query-form">
-        <input type="text" id="question" name="question" placeholder="Enter your question..." required>
-        <button type="submit">Search</button>
-    </form>
-    <div id="loading-spinner" class="hidden">
-        <div class="spinner"></div>
-    </div>
-    <div id="result-container" class="result-container"></div>
-    <script>
-        const form = document.querySelector('#query-form');
-        const spinner = document.getElementById('loading-spinner');
-        const resultContainer = document.getElementById('result-container');
-
-        form.addEventListener('submit', async (e) => {
-            e.preventDefault();
-            resultContainer.innerHTML = '';
-            spinner.classList.remove('hidden'); // הצגת הספינר
-
-            const question = document.getElementById('question').value;
-            const response = await fetch('/process', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
-                body: `question=${encodeURIComponent(question)}`
-            });
-            const data = await response.json();
-
-            spinner.classList.add('hidden');
-
-            if (data.analysis && data.analysis.analyzed_passages) {
-                data.analysis.analyzed_passages.forEach((passage, index) => {
-                    const card = `
-                        <div class="card">
-                            <h3>${passage.source}</h3>
-                            <p><strong>סיכום:</strong> ${passage.explanation}</p>
-                            <p><span class="expand-btn" onclick="toggleExpand('passage-${index}')">View Full Passage</span></p>
-                            <div id="passage-${index}" class="hidden full-text">
-                                ${passage.passage}
-                            </div>
-                        </div>
-                    `;
-                    resultContainer.innerHTML += card;
-                });
-            } else {
-                resultContainer.innerHTML = '<p>No analysis available.</p>';
-            }
-        });
-
-        function toggleExpand(id) {
-            const element = document.getElementById(id);
-            element.classList.toggle('hidden');
-        }
-    </script>
-</body>
-</html>
-    '''
+async def index():
+    encoding = request.accept_encodings.best_match(list(INDEX_ENCODINGS))
+    etag = f"{INDEX_ETAG}-{encoding}" if encoding else INDEX_ETAG
+
+    if request.if_none_match.contains(etag):
+        response = Response(b'', status=304)
+    elif encoding:
+        response = Response(INDEX_ENCODINGS[encoding], mimetype='text/html')
+        response.content_encoding = encoding
+    else:
+        response = Response(INDEX_BYTES, mimetype='text/html')
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response
+
+
+# The dataset step 2 searches
+DATASET_PATH = Path("data/dataset.csv")
+
+
+@app.before_serving
+async def warm_dataset():
+    # The steps can't overlap (each reads the previous step's output), but the
+    # dataset step 2 searches doesn't depend on step 1, so parse it in the
+    # background while the first requests are still in step 1.
+    app.add_background_task(load_dataset, DATASET_PATH)
 
 
 @app.route('/process', methods=['POST'])
-def process():
-    question = request.form.get('question')
+async def process():
+    form = await request.form
+    question = form.get('question')
 
     if not question:
         return jsonify({"error": "No question provided."}), 400
@@ -179,8 +197,9 @@ def process():
     steps = [
         {
             "name": "Step 1: Understanding The Question",
-            "function":
-            lambda: execute_with_timeout(step_1_main, 300, question)
+            "function": step_1_main,
+            "args": (question, ),
+            "timeout": 300
         },
         {
             "name": "Step 2: Reading",
@@ -196,41 +215,65 @@ def process():
         },
     ]
 
-    results = []
-
-    for step in steps:
-        try:
-            logger.info(f"Starting {step['name']}...")
-            step['function']()
-            results.append({"step": step['name'], "status": "success"})
-        except TimeoutError as e:
-            logger.error(f"Timeout in {step['name']}: {e}")
-            return jsonify({"error":
-                            f"Timeout in {step['name']}: {str(e)}"}), 500
-        except Exception as e:
-            logger.error(f"An error occurred in {step['name']}: {e}")
-            return jsonify({"error":
-                            f"Error in {step['name']}: {str(e)}"}), 500
-
-    folder_path = "data/answers/*/step_4/passage_analysis.json"
-    file_list = glob.glob(folder_path)
-    latest_file = max(file_list, key=os.path.getctime) if file_list else None
-
-    if latest_file and os.path.exists(latest_file):
-        with open(latest_file, 'r', encoding='utf-8') as file:
-            analysis_data = json.load(file)
-        return jsonify({
-            "status": "success",
-            "results": results,
-            "analysis": analysis_data
-        })
+    # Re-parse the dataset alongside step 1 if it changed since it was cached;
+    # when it hasn't, this is just a stat.
+    app.add_background_task(load_dataset, DATASET_PATH)
+
+    async def generate():
+        # Per-step timings are logged as one record once the pipeline is done
+        step_timings = {}
+        # Step 1 returns the new question's ID; the later steps are given it
+        # instead of taking the newest entry of the shared manifest, which
+        # may belong to a concurrent request
+        question_id = None
+        for step in steps:
+            try:
+                yield sse_event({"step": step['name'], "status": "running"})
+                started = time.perf_counter()
+                output = await run_step(step['function'], step.get('timeout'),
+                                        *step.get('args', (question_id, )))
+                if question_id is None:
+                    question_id = output
+                step_timings[step['name']] = round(
+                    time.perf_counter() - started, 3)
+                yield sse_event({"step": step['name'], "status": "success"})
+            except NoMatchesError as e:
+                logger.info("%s: %s", step['name'], e)
+                yield sse_event({"status": "no_matches", "message": str(e)})
+                return
+            except TimeoutError as e:
+                logger.error("Timeout in %s: %s", step['name'], e)
+                yield sse_event(
+                    {"error": f"Timeout in {step['name']}: {str(e)}"})
+                return
+            except Exception as e:
+                logger.error("An error occurred in %s: %s", step['name'], e)
+                yield sse_event(
+                    {"error": f"Error in {step['name']}: {str(e)}"})
+                return
+
+        logger.info("Pipeline finished: %s",
+                    step_timings,
+                    extra={"steps": step_timings})
+
+        # Step 4 (the last step) returns the analysis it saved, so it is sent
+        # as is rather than read back from data/answers
+        yield sse_event({"status": "success", "analysis": output})
+
+    if request.accept_encodings.best_match(['gzip']):
+        response = Response(gzip_stream(generate()),
+                            mimetype='text/event-stream')
+        response.content_encoding = 'gzip'
     else:
-        return jsonify({
-            "status": "success",
-            "results": results,
-            "analysis": "No analysis file found."
-        })
+        response = Response(generate(), mimetype='text/event-stream')
+    response.vary.add('Accept-Encoding')
+    # The pipeline runs for minutes; don't cut the stream at RESPONSE_TIMEOUT.
+    response.timeout = None
+    return response
 
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=8080, debug=True)
+    # Local runs only; deployments start the app under uvicorn (see .replit)
+    app.run(host='0.0.0.0',
+            port=8080,
+            debug=os.environ.get("QUART_ENV") == "development")
@@ -25,6 +25,9 @@ FINAL_FIELDS = [
     "translation", "summary", "keywords"
 ]
 
+# Number of normalized rows buffered before each write
+WRITE_BATCH_SIZE = 4096
+
 
 def main():
     if len(sys.argv) < 2:
@@ -49,73 +52,69 @@ def main():
         print(f"No CSV files found in the folder '{folder_path}'.")
         sys.exit(0)
 
-    # We'll store normalized rows here
-    all_rows = []
-
-    # Process each CSV file
-    for filename in csv_files:
-        filepath = os.path.join(folder_path, filename)
-        with open(filepath, 'r', encoding='utf-8') as infile:
-            reader = csv.DictReader(infile)
-            for row in reader:
-                # Build a new row according to the FINAL_FIELDS
-                new_row = {}
-
-                # (1) book_name
-                book_name = row.get('book_name', '').strip()
-                if not book_name:
-                    book_name = "Divrey Yoel"
-
-                # (2) section
-                section = row.get('section', '').strip()
-                if not section:
-                    section = "Torah"
-
-                # (3) topic -> from 'topic' or fallback to 'parsha_name'
-                topic = row.get('topic', '').strip()
-                if not topic:
-                    topic = row.get('parsha_name', '').strip()
-
-                # (4) torah #
-                torah_number = row.get('torah #', '').strip()
-                if not torah_number:
-                    torah_number = row.get('dvar_torah_id', '').strip()
-
-                # (5) passage #
-                passage_number = row.get('passage #', '').strip()
-                if not passage_number:
-                    passage_number = row.get('passage_id', '').strip()
-
-                # (6) hebrew_text
-                hebrew_text = row.get('hebrew_text', '').strip()
-                if not hebrew_text:
-                    hebrew_text = row.get('passage_content', '').strip()
-
-                # translation, summary, keywords
-                translation = row.get('translation', '').strip()
-                summary = row.get('summary', '').strip()
-                keywords = row.get('keywords', '').strip()
-
-                new_row["book_name"] = book_name
-                new_row["section"] = section
-                new_row["topic"] = topic
-                new_row["torah #"] = torah_number
-                new_row["passage #"] = passage_number
-                new_row["hebrew_text"] = hebrew_text
-                new_row["translation"] = translation
-                new_row["summary"] = summary
-                new_row["keywords"] = keywords
-
-                all_rows.append(new_row)
-
-    # Write combined CSV
+    # Rows are written as they're normalized, in batches, so the combined
+    # dataset is never held in memory
+    total_rows = 0
+    batch = []
     with open(output_csv, 'w', encoding='utf-8', newline='') as outfile:
-        writer = csv.DictWriter(outfile, fieldnames=FINAL_FIELDS)
-        writer.writeheader()
-        writer.writerows(all_rows)
+        writer = csv.writer(outfile)
+        writer.writerow(FINAL_FIELDS)
+
+        # Process each CSV file
+        for filename in csv_files:
+            filepath = os.path.join(folder_path, filename)
+            with open(filepath, 'r', encoding='utf-8') as infile:
+                reader = csv.DictReader(infile)
+                for row in reader:
+                    # (1) book_name
+                    book_name = row.get('book_name', '').strip()
+                    if not book_name:
+                        book_name = "Divrey Yoel"
+
+                    # (2) section
+                    section = row.get('section', '').strip()
+                    if not section:
+                        section = "Torah"
+
+                    # (3) topic -> from 'topic' or fallback to 'parsha_name'
+                    topic = row.get('topic', '').strip()
+                    if not topic:
+                        topic = row.get('parsha_name', '').strip()
+
+                    # (4) torah #
+                    torah_number = row.get('torah #', '').strip()
+                    if not torah_number:
+                        torah_number = row.get('dvar_torah_id', '').strip()
+
+                    # (5) passage #
+                    passage_number = row.get('passage #', '').strip()
+                    if not passage_number:
+                        passage_number = row.get('passage_id', '').strip()
+
+                    # (6) hebrew_text
+                    hebrew_text = row.get('hebrew_text', '').strip()
+                    if not hebrew_text:
+                        hebrew_text = row.get('passage_content', '').strip()
+
+                    # translation, summary, keywords
+                    translation = row.get('translation', '').strip()
+                    summary = row.get('summary', '').strip()
+                    keywords = row.get('keywords', '').strip()
+
+                    # Build the new row as a tuple in FINAL_FIELDS order
+                    batch.append((book_name, section, topic, torah_number,
+                                  passage_number, hebrew_text, translation,
+                                  summary, keywords))
+                    if len(batch) >= WRITE_BATCH_SIZE:
+                        writer.writerows(batch)
+                        total_rows += len(batch)
+                        batch.clear()
+
+        writer.writerows(batch)
+        total_rows += len(batch)
 
     print(
-        f"Combined {len(csv_files)} CSV file(s) into '{output_csv}' with {len(all_rows)} total rows."
+        f"Combined {len(csv_files)} CSV file(s) into '{output_csv}' with {total_rows} total rows."
     )
 
 
@@ -1,7 +1,10 @@
 import asyncio
 import csv
+import hashlib
+import json
 import os
 import re
+import sqlite3
 import sys
 from typing import List, Dict
 from litellm import acompletion
@@ -9,91 +12,136 @@ from litellm import acompletion
 # Example how to run:
 # python data/preprocessing/enrich_csv_with_translation_and_keywords.py data/divrey_yoel_vayechi.csv data/divrey_yoel_vayechi_enriched.csv 10
 
+# Matches any HTML tag in a passage; compiled once for all passages
+HTML_TAG_PATTERN = re.compile(r'<[^>]*>')
+
+MODEL = 'gpt-4o-mini'  # "claude-3-5-sonnet-20241022",
+
+# Reply budget for the translation, summary and keywords together; the long
+# passages need well over 1500 tokens for all three plus the JSON wrapping
+MAX_TOKENS = 4096
+
+# Report progress once per this many completed passages, not per passage
+PROGRESS_INTERVAL = 100
+
+
+def parse_enrichment(reply: str) -> Dict[str, str]:
+    """Turn the model's JSON reply into the translation/summary/keywords fields.
+
+    Raises ValueError unless every field is present and non-empty.
+    """
+    fields = json.loads(reply)
+    if not isinstance(fields, dict):
+        raise ValueError(f"Reply is not a JSON object: {reply!r}")
+    for field in ("translation", "summary"):
+        value = fields.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"Missing or empty {field} in reply: {value!r}")
+    keywords = fields.get("keywords")
+    # json_object mode doesn't enforce the schema, so the terms may come back
+    # as a single newline- or comma-separated string instead of a list
+    if isinstance(keywords, str):
+        keywords = re.split(r"[\n,]", keywords)
+    if not isinstance(keywords, list) or not all(
+            isinstance(term, str) for term in keywords):
+        raise ValueError(f"Unexpected keywords in reply: {keywords!r}")
+    keywords = [term.strip() for term in keywords if term.strip()]
+    if not keywords:
+        raise ValueError("No keywords in reply")
+    return {
+        "translation": fields["translation"],
+        "summary": fields["summary"],
+        # Stored one term per line, as before
+        "keywords": "\n".join(keywords),
+    }
+
 
 class HebrewTextProcessor:
 
-    def __init__(self, max_concurrent: int):
+    def __init__(self, max_concurrent: int, cache_path: str = ".llm_cache.sqlite"):
         self.max_concurrent = max_concurrent  # Bounded parallelism
-
-    async def call_litellm(self, prompt: str) -> str:
+        # Bounds the LLM requests in flight; cache hits don't take a slot
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        # Replies are deterministic (temperature=0), so a prompt that was
+        # already answered in an earlier run is served from disk
+        self.cache = sqlite3.connect(cache_path)
+        self.cache.execute(
+            "CREATE TABLE IF NOT EXISTS replies (key TEXT PRIMARY KEY, reply TEXT)")
+
+    async def call_litellm(self, prompt: str, response_format=None) -> str:
         """Make an asynchronous call to LiteLLM with a prompt."""
-        try:
-            messages = [{"role": 'user', "content": prompt}]
-            model = 'gpt-4o-mini'  # "claude-3-5-sonnet-20241022",
-            response = await acompletion(model=model,
+        messages = [{"role": 'user', "content": prompt}]
+        async with self.semaphore:
+            response = await acompletion(model=MODEL,
                                          messages=messages,
-                                         max_tokens=1500,
+                                         max_tokens=MAX_TOKENS,
                                          temperature=0,
-                                         num_retries=3)
-            assistant_reply = response.choices[0].message.content.strip()
-            return assistant_reply
-        except Exception as e:
-            print(f"API error: {e}")
-            return "API call failed"
-
-    async def translate_text(self, hebrew_text: str) -> str:
-        """Translate Hebrew text to English using the exact prompt."""
-        prompt = f"""Please translate the following Hebrew text into English. This is from Sefer Divrey Yoel:
-
-        Hebrew text: {hebrew_text}
-
-        Provide the translation, preserving Hasidic concepts and terminology. Output only the translation - do not add any explanations or comments."""
-        return await self.call_litellm(prompt)
-
-    async def generate_summary(self, hebrew_text: str) -> str:
-        """Generate a summary of the Hebrew text using the exact prompt."""
-        prompt = f"""Please read and summarize the following Hebrew passage from Sefer Divrey Yoel.
-        Focus on the key Hasidic concepts and theological insights:
-
-        Hebrew text: {hebrew_text}
+                                         num_retries=3,
+                                         response_format=response_format)
+        choice = response.choices[0]
+        if choice.finish_reason == "length":
+            raise ValueError(f"Reply truncated at {MAX_TOKENS} tokens")
+        return choice.message.content.strip()
 
-        Provide a clear 3-4 sentence summary that captures the theological depth. Output only the summary - do not add any explanations or comments."""
-        return await self.call_litellm(prompt)
-
-    async def generate_keywords(self, hebrew_text: str) -> str:
-        """Extract key Hebrew/Jewish theological terms using the exact prompt."""
-        prompt = f"""Please extract 10 key Hebrew/Jewish theological terms from this Hebrew passage:
+    async def enrich_text(self, hebrew_text: str) -> Dict[str, str]:
+        """Translate, summarize and extract keywords from the Hebrew text in one call."""
+        prompt = f"""Please do the following for this Hebrew passage from Sefer Divrey Yoel:
 
         Hebrew text: {hebrew_text}
 
-        List exactly 10 terms, one per line, focusing on Hasidic and Kabbalistic concepts. Output only the terms - do not add any explanations or comments and do not number the terms."""
-        return await self.call_litellm(prompt)
+        1. "translation": Translate the Hebrew text into English, preserving Hasidic concepts and terminology.
+        2. "summary": Provide a clear 3-4 sentence summary that captures the theological depth, focusing on the key Hasidic concepts and theological insights.
+        3. "keywords": Extract exactly 10 key Hebrew/Jewish theological terms, focusing on Hasidic and Kabbalistic concepts. Do not number the terms.
+
+        Respond with a JSON object with the keys "translation", "summary" and "keywords" (a list of strings). Output only the JSON object - do not add any explanations or comments."""
+        key = hashlib.sha256(f"{MODEL}\n{prompt}".encode('utf-8')).hexdigest()
+        cached = self.cache.execute("SELECT reply FROM replies WHERE key = ?",
+                                    (key, )).fetchone()
+        if cached:
+            try:
+                return parse_enrichment(cached[0])
+            except ValueError:
+                pass  # Treat an invalid cached reply as a miss
+        reply = await self.call_litellm(
+            prompt, response_format={"type": "json_object"})
+        enriched = parse_enrichment(reply)
+        # Only validated replies are cached, so failures are retried
+        with self.cache:
+            self.cache.execute("INSERT OR REPLACE INTO replies VALUES (?, ?)",
+                               (key, reply))
+        return enriched
 
     async def process_passage(self, passage: Dict[str, str]) -> Dict[str, str]:
         """Enrich a single passage. Returns the updated passage dict."""
         # Strip out any HTML tags
-        hebrew_text = re.sub(r'<[^>]*>', '', passage['passage_content'])
+        hebrew_text = HTML_TAG_PATTERN.sub('', passage['passage_content'])
         passage['passage_content'] = hebrew_text
-        
-        print(
-            f"Processing: {passage['book_name']} - {passage['parsha_name']} "
-            f"- Torah #{passage['dvar_torah_id']} - Passage #{passage['passage_id']}"
-        )
 
         try:
-            # Process asynchronously
-            translation_task = asyncio.create_task(
-                self.translate_text(hebrew_text))
-            summary_task = asyncio.create_task(
-                self.generate_summary(hebrew_text))
-            keywords_task = asyncio.create_task(
-                self.generate_keywords(hebrew_text))
-
-            translation, summary, keywords = await asyncio.gather(
-                translation_task, summary_task, keywords_task)
-
             # Enrich the passage
-            passage['translation'] = translation
-            passage['summary'] = summary
-            passage['keywords'] = keywords
+            passage.update(await self.enrich_text(hebrew_text))
 
         except Exception as e:
             # On error, keep the fields unfilled
-            print(f"Error processing passage: {e}")
+            print(
+                f"Error processing {passage['book_name']} - {passage['parsha_name']} "
+                f"- Torah #{passage['dvar_torah_id']} - Passage #{passage['passage_id']}: {e}"
+            )
 
         return passage
 
 
+def write_csv(path: str, fieldnames: List[str], rows: List[Dict[str, str]]):
+    """Rewrite the CSV via a temp file, so an interrupted write never truncates it."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(fieldnames)
+        writer.writerows(
+            tuple(row[field] for field in fieldnames) for row in rows)
+    os.replace(tmp_path, path)
+
+
 async def main():
     if len(sys.argv) != 4:
         print(
@@ -105,71 +153,62 @@ async def main():
     output_csv = sys.argv[2]
     max_concurrent = int(sys.argv[3])
 
-    # 1. If output CSV doesn't exist, create it with extra fields
-    if not os.path.exists(output_csv):
-        with open(input_csv, 'r', encoding='utf-8') as infile, \
-             open(output_csv, 'w', encoding='utf-8', newline='') as outfile:
-            reader = csv.DictReader(infile)
-            fieldnames = reader.fieldnames + [
-                "translation", "summary", "keywords"
-            ]
-            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in reader:
-                row['translation'] = ""
-                row['summary'] = ""
-                row['keywords'] = ""
-                writer.writerow(row)
-
-    # 2. Read all lines from output CSV
-    with open(output_csv, 'r', encoding='utf-8') as infile:
+    enriched_fields = ["translation", "summary", "keywords"]
+
+    def row_key(row):
+        return (row['book_name'], row['parsha_name'], row['dvar_torah_id'],
+                row['passage_id'])
+
+    # 1. Read all lines from the input CSV
+    with open(input_csv, 'r', encoding='utf-8') as infile:
         reader = csv.DictReader(infile)
-        fieldnames = reader.fieldnames
+        fieldnames = reader.fieldnames + enriched_fields
         passages = list(reader)
 
+    # 2. Collect the rows an earlier run already enriched, so they're skipped
+    done = {}
+    if os.path.exists(output_csv):
+        with open(output_csv, 'r', encoding='utf-8') as infile:
+            for row in csv.DictReader(infile):
+                if all(row.get(field) for field in enriched_fields):
+                    done[row_key(row)] = row
+
     processor = HebrewTextProcessor(max_concurrent)
-    semaphore = asyncio.Semaphore(max_concurrent)
-
-    # 3. Process only rows where translation/summary/keywords are unfilled
-    #    We'll do it in chunks so partial results are saved incrementally.
-    idx = 0
-    total = len(passages)
-
-    while idx < total:
-        chunk_tasks = []
-        chunk_indices = []
-
-        # Build a chunk up to max_concurrent lines that need processing
-        while len(chunk_tasks) < max_concurrent and idx < total:
-            row = passages[idx]
-            if (not row['translation']) or (not row['summary']) or (
-                    not row['keywords']):
-                # This row is missing at least one field
-                async def handle_row(r=row, i=idx):
-                    async with semaphore:
-                        updated = await processor.process_passage(r)
-                        return (i, updated)
-
-                chunk_tasks.append(handle_row())
-                chunk_indices.append(idx)
-            idx += 1
-
-        # If no tasks found, we're done
-        if not chunk_tasks:
-            break
-
-        # Gather results for this chunk
-        results = await asyncio.gather(*chunk_tasks)
-
-        # Update and write incremental results to CSV
-        for row_index, updated_passage in results:
-            passages[row_index] = updated_passage
-
-        # Write the entire CSV to persist partial progress
-        with open(output_csv, 'w', encoding='utf-8', newline='') as outfile:
-            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(passages)
+
+    # 3. Process only rows that aren't enriched yet.
+    #    Every such row is scheduled up front and the processor keeps
+    #    max_concurrent LLM calls in flight, so a new row starts as soon as any
+    #    finishes instead of waiting for the slowest row of a chunk.
+    tasks = [
+        processor.process_passage(row) for row in passages
+        if row_key(row) not in done
+    ]
+
+    # Each enriched row is appended as soon as it completes, so progress
+    # survives an interruption without rewriting the file per row
+    with open(output_csv, 'a', encoding='utf-8', newline='') as outfile:
+        writer = csv.writer(outfile)
+        if outfile.tell() == 0:
+            writer.writerow(fieldnames)
+        for completed, next_done in enumerate(asyncio.as_completed(tasks),
+                                              start=1):
+            updated_passage = await next_done
+            if completed % PROGRESS_INTERVAL == 0 or completed == len(tasks):
+                print(f"Processed {completed}/{len(tasks)} passages")
+            if all(updated_passage.get(field) for field in enriched_fields):
+                writer.writerow(
+                    tuple(updated_passage[field] for field in fieldnames))
+                outfile.flush()
+                done[row_key(updated_passage)] = updated_passage
+
+    # 4. Rewrite the output once in input order, leaving the rows that failed
+    #    unfilled so the next run retries them
+    write_csv(output_csv, fieldnames, [
+        done.get(row_key(row)) or {
+            **row,
+            **dict.fromkeys(enriched_fields, "")
+        } for row in passages
+    ])
 
     print(f"Incremental enrichment complete. Results saved to {output_csv}")
 
@@ -10,6 +10,7 @@ See LICENSE.md for terms of use.
 # main.py
 
 import logging
+import os
 from rich.console import Console
 from rich.logging import RichHandler
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
@@ -17,8 +18,10 @@ from rich.panel import Panel
 from rich.traceback import install
 from concurrent.futures import ThreadPoolExecutor, TimeoutError
 
-# Install rich traceback handler
-install(show_locals=True)
+# Install rich traceback handler in development only; show_locals makes every
+# traceback repr the locals of every frame
+if os.environ.get("QUART_ENV") == "development":
+    install(show_locals=True)
 
 # Initialize Rich console
 console = Console()
@@ -31,16 +34,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger("main_script")
 
+# Shared pool for timed step calls, so each call doesn't spawn and join a thread
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="step")
+
 def execute_with_timeout(func, timeout, *args, **kwargs):
     """Run a function with a timeout to prevent hangs."""
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        future = executor.submit(func, *args, **kwargs)
-        try:
-            return future.result(timeout=timeout)
-        except TimeoutError:
-            future.cancel()
-            logger.error("[red]Timeout occurred during execution.[/red]")
-            raise TimeoutError(f"Execution of {func.__name__} exceeded {timeout} seconds.")
+    future = _EXECUTOR.submit(func, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        future.cancel()
+        logger.error("[red]Timeout occurred during execution.[/red]")
+        raise TimeoutError(f"Execution of {func.__name__} exceeded {timeout} seconds.")
 
 def main():
     # Get the question from the user first
@@ -54,7 +59,7 @@ def main():
     # Import the main functions from each step
     from step_1 import main as step_1_main
     from step_2 import main as step_2_main
-    from step_3 import main as step_3_main
+    from step_3 import main as step_3_main, NoMatchesError
     from step_4 import main as step_4_main
 
     # Define the steps and their corresponding functions
@@ -80,18 +85,22 @@ def main():
         for step in steps:
             progress.update(task, description=f"[bold blue]{step['name']}...[/bold blue]")
             try:
-                logger.info(f"[cyan]Starting {step['name']}...[/cyan]")
+                logger.info("[cyan]Starting %s...[/cyan]", step['name'])
                 step['function']()
                 progress.advance(task)
-                logger.info(f"[cyan]Executing Step 1 with question: {question}[/cyan]")
+                logger.info("[cyan]Executing Step 1 with question: %s[/cyan]", question)
+
+            except NoMatchesError as e:
+                console.print(Panel.fit(f"[yellow]{e}[/yellow]", title="No Matches", border_style="yellow"))
+                return
 
             except TimeoutError as e:
-                logger.error(f"[red]Timeout in {step['name']}: {e}[/red]")
+                logger.error("[red]Timeout in %s: %s[/red]", step['name'], e)
                 console.print(Panel.fit(f"[red]Timeout in {step['name']}: {e}[/red]", title="Error Details", border_style="red"))
                 exit(1)
 
             except Exception as e:
-                logger.error(f"[red]An error occurred in {step['name']}: {e}[/red]")
+                logger.error("[red]An error occurred in %s: %s[/red]", step['name'], e)
                 console.print(Panel.fit(f"[red]Error in {step['name']}: {e}[/red]", title="Error Details", border_style="red"))
                 exit(1)
 
@@ -102,6 +111,6 @@ import sys
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "web":
         from app import app
-        app.run(host='0.0.0.0', port=8080, debug=True)
+        app.run(host='0.0.0.0', port=8080, debug=os.environ.get("QUART_ENV") == "development")
     else:
         main()
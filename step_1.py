@@ -10,10 +10,12 @@ See LICENSE.md for terms of use.
 # step_1.py
 
 import json
+import orjson
 import os
 from pathlib import Path
 import logging
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Dict
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
@@ -26,8 +28,10 @@ from rich.logging import RichHandler
 from rich.panel import Panel
 from rich.traceback import install
 
-# Install rich traceback handler
-install(show_locals=True)
+# Install rich traceback handler in development only; show_locals makes every
+# traceback repr the locals of every frame
+if os.environ.get("QUART_ENV") == "development":
+    install(show_locals=True)
 
 # Initialize Rich console
 console = Console()
@@ -55,21 +59,24 @@ def log_json_path(json_path: Path):
     manifest_path = Path("data/manifest.json")
     manifest = []
 
-    # Load existing manifest if it exists
-    if manifest_path.exists():
-        with manifest_path.open("r", encoding="utf-8") as f:
-            manifest = json.load(f)
-
-    # Check for duplicate paths
-    if str(json_path) not in [entry["path"] for entry in manifest]:
-        manifest.append({
-            "timestamp": datetime.now().isoformat(),
-            "path": str(json_path)
-        })
-
-    # Save the updated manifest
-    with manifest_path.open("w", encoding="utf-8") as f:
-        json.dump(manifest, f, indent=4)
+    with lock:
+        # Load existing manifest if it exists
+        if manifest_path.exists():
+            manifest = orjson.loads(manifest_path.read_bytes())
+
+        # Check for duplicate paths
+        if str(json_path) not in [entry["path"] for entry in manifest]:
+            manifest.append({
+                "timestamp": datetime.now().isoformat(),
+                "path": str(json_path)
+            })
+
+        # Save the updated manifest via a temp file, so a reader in another
+        # worker process never sees it half-written
+        tmp_path = manifest_path.with_name(f"manifest.{uuid.uuid4()}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, manifest_path)
     logger.info(f"[green]Logged JSON path: {json_path}[/green]")
 
 
@@ -230,9 +237,24 @@ def load_and_chunk_all_files(folder_path: str, chunk_text_func,
         raise FileNotFoundError(
             f"Folder {folder} not found or is not a directory.")
 
+    # Key the cached chunks on each file's mtime and size so edits to the
+    # dataset are picked up without re-reading it on every question
+    text_files = []
+    for text_file in folder.glob("*.txt"):
+        stat = text_file.stat()
+        text_files.append((text_file, stat.st_mtime_ns, stat.st_size))
+
+    return list(
+        _load_and_chunk_files(tuple(text_files), chunk_text_func, chunk_size))
+
+
+@lru_cache(maxsize=4)
+def _load_and_chunk_files(text_files: tuple, chunk_text_func,
+                          chunk_size: int) -> tuple:
+    """Read and chunk the given (path, mtime, size) files; cached by load_and_chunk_all_files."""
     all_chunks = []
 
-    for text_file in folder.glob("*.txt"):
+    for text_file, _, _ in text_files:
         with text_file.open("r", encoding="utf-8") as f:
             content = f.read().strip()
             if not content:
@@ -240,7 +262,7 @@ def load_and_chunk_all_files(folder_path: str, chunk_text_func,
             chunks = chunk_text_func(content, chunk_size)
             all_chunks.extend(chunks)
 
-    return all_chunks
+    return tuple(all_chunks)
 
 
 def main(question=None):
@@ -283,6 +305,9 @@ def main(question=None):
                     logger.error(f"[red]Error processing a chunk: {e}[/red]")
 
         save_to_question_folder(question, raw_answers, question_id)
+        # Returned so the later steps work on this question rather than on
+        # whichever is newest in the manifest
+        return question_id
 
     except Exception as e:
         logger.error(f"[red]An error occurred: {e}[/red]")
@@ -10,18 +10,24 @@ See LICENSE.md for terms of use.
 # step_2.py
 
 import json
+import orjson
+import os
 import pandas as pd
 from pathlib import Path
 import re
 from datetime import datetime
+from functools import lru_cache
+from threading import Lock
 from rich.console import Console
 from rich.logging import RichHandler
 from rich.panel import Panel
 from rich.traceback import install
 import logging
 
-# Install rich traceback handler
-install(show_locals=True)
+# Install rich traceback handler in development only; show_locals makes every
+# traceback repr the locals of every frame
+if os.environ.get("QUART_ENV") == "development":
+    install(show_locals=True)
 
 # Initialize Rich console
 console = Console()
@@ -32,6 +38,9 @@ logging.basicConfig(level=logging.DEBUG,
                     handlers=[RichHandler(rich_tracebacks=True, markup=True)])
 logger = logging.getLogger("step_2_script")
 
+# Serializes dataset loads so concurrent callers share one parsed copy
+_dataset_lock = Lock()
+
 
 def get_latest_question_id():
     """Get the most recent question ID from the manifest file."""
@@ -40,8 +49,7 @@ def get_latest_question_id():
         raise FileNotFoundError(
             "Manifest file not found. Please run step 1 first.")
 
-    with manifest_path.open("r", encoding="utf-8") as f:
-        manifest = json.load(f)
+    manifest = orjson.loads(manifest_path.read_bytes())
 
     if not manifest:
         raise ValueError("Manifest is empty. Please run step 1 first.")
@@ -59,13 +67,10 @@ def retry_search(section, topic, torah_number, passage_number,
     try:
         # Strategy 1: Exact match but case-insensitive
         matched_row = csv_data[
-            (csv_data["section"].str.strip().str.lower() == section.lower())
-            & (csv_data["topic"].str.strip().str.lower() == topic.lower()) &
-            (csv_data["torah_number"].astype(str) == torah_number)
-            &  # <-- CHANGED
-            (csv_data["passage_number"].astype(str) == passage_number
-             )  # <-- CHANGED
-        ]
+            (csv_data["section_key"] == section.lower())
+            & (csv_data["topic_key"] == topic.lower())
+            & (csv_data["torah_number"] == torah_number)
+            & (csv_data["passage_number"] == passage_number)]
         if not matched_row.empty:
             logger.info(
                 f"[green]Strategy 1 (Exact match) successful for Section: '{section}', Topic: '{topic}', Torah #: '{torah_number}', Passage #: '{passage_number}'[/green]"
@@ -78,15 +83,10 @@ def retry_search(section, topic, torah_number, passage_number,
                 section_part, topic_part = topic.split(",", 1)
                 combined_section = f"{section}, {section_part}".strip()
                 matched_row = csv_data[
-                    (csv_data["section"].str.strip().str.lower() ==
-                     combined_section.lower())
-                    & (csv_data["topic"].str.strip().str.lower() ==
-                       topic_part.strip().lower()) &
-                    (csv_data["torah_number"].astype(str) == torah_number)
-                    &  # <-- CHANGED
-                    (csv_data["passage_number"].astype(str) == passage_number
-                     )  # <-- CHANGED
-                ]
+                    (csv_data["section_key"] == combined_section.lower())
+                    & (csv_data["topic_key"] == topic_part.strip().lower())
+                    & (csv_data["torah_number"] == torah_number)
+                    & (csv_data["passage_number"] == passage_number)]
                 if not matched_row.empty:
                     logger.info(
                         f"[green]Strategy 2 (Comma-split) successful for Section: '{section}', Topic: '{topic}', Torah #: '{torah_number}', Passage #: '{passage_number}'[/green]"
@@ -99,17 +99,15 @@ def retry_search(section, topic, torah_number, passage_number,
         # Strategy 3: Try matching with section as topic and vice versa
         try:
             matched_row = csv_data[(
-                (csv_data["section"].str.strip().str.lower() == topic.lower())
-                &
-                (csv_data["topic"].str.strip().str.lower() == section.lower())
-                | (csv_data["section"].str.strip().str.lower().str.contains(
-                    section.lower(), na=False)) & (csv_data["topic"].str.strip(
-                    ).str.lower().str.contains(topic.lower(), na=False)))
-                                   & (csv_data["torah_number"].astype(str) ==
-                                      torah_number)  # <-- CHANGED
-                                   & (csv_data["passage_number"].astype(str)
-                                      == passage_number)  # <-- CHANGED
-                                   ]
+                (csv_data["section_key"] == topic.lower())
+                & (csv_data["topic_key"] == section.lower())
+                | (csv_data["section_key"].str.contains(
+                    section.lower(), regex=False))
+                & (csv_data["topic_key"].str.contains(topic.lower(),
+                                                      regex=False)))
+                                   & (csv_data["torah_number"] == torah_number)
+                                   & (csv_data["passage_number"] ==
+                                      passage_number)]
             if not matched_row.empty:
                 logger.info(
                     f"[green]Strategy 3 (Cross-match) successful for Section: '{section}', Topic: '{topic}', Torah #: '{torah_number}', Passage #: '{passage_number}'[/green]"
@@ -169,6 +167,60 @@ def retry_search(section, topic, torah_number, passage_number,
         return None
 
 
+def load_dataset(csv_file_path: Path) -> pd.DataFrame:
+    """Load the dataset CSV, reusing the parsed copy while the file is unchanged."""
+    with _dataset_lock:
+        return _load_dataset(csv_file_path, csv_file_path.stat().st_mtime)
+
+
+@lru_cache(maxsize=1)
+def _load_dataset(csv_file_path: Path, mtime: float) -> pd.DataFrame:
+    """Read and normalize the dataset CSV. Callers must not mutate the result."""
+    logger.info(f"[cyan]Loading CSV file from {csv_file_path}...[/cyan]")
+    csv_data = pd.read_csv(csv_file_path)
+
+    # Standardize column names for matching
+    csv_data.rename(
+        columns={
+            "section":
+            "section",  # <-- CHANGED (only if CSV has lowercase column headers)
+            "topic": "topic",  # <-- CHANGED
+            "torah #": "torah_number",  # <-- CHANGED
+            "passage #": "passage_number",  # <-- CHANGED
+            "hebrew_text": "passage",  # <-- CHANGED
+            "translation": "english_translation",  # <-- CHANGED
+        },
+        inplace=True,
+    )
+
+    # Preprocess CSV data
+    for col in ["section", "topic", "torah_number",
+                "passage_number"]:  # <-- CHANGED
+        csv_data[col] = csv_data[col].astype(str).str.strip()
+
+    # Lower-cased match keys, built once so lookups don't re-normalize whole
+    # columns for every passage
+    csv_data["section_key"] = csv_data["section"].str.lower()
+    csv_data["topic_key"] = csv_data["topic"].str.lower()
+
+    # Ensure required columns exist
+    required_columns = [
+        "section",
+        "topic",
+        "torah_number",  # <-- CHANGED
+        "passage_number",  # <-- CHANGED
+        "passage",
+        "english_translation",
+    ]
+    for col in required_columns:
+        if col not in csv_data.columns:
+            raise ValueError(
+                f"[ERROR] Missing required column '{col}' in the CSV file."
+            )
+
+    return csv_data
+
+
 def process_response_file_with_csv(input_json_path: Path, csv_file_path: Path,
                                    output_json_path: Path):
     """Process the response.json file, search the CSV file for each passage, retry on failure, and save the results."""
@@ -176,8 +228,7 @@ def process_response_file_with_csv(input_json_path: Path, csv_file_path: Path,
         # Load the JSON data
         logger.info(
             f"[cyan]Loading input JSON file from {input_json_path}...[/cyan]")
-        with input_json_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = orjson.loads(input_json_path.read_bytes())
 
         # Validate JSON structure
         if "answer" not in data or "relevant_passages" not in data["answer"]:
@@ -190,43 +241,8 @@ def process_response_file_with_csv(input_json_path: Path, csv_file_path: Path,
             raise ValueError(
                 "[ERROR] No relevant passages found in the JSON file.")
 
-        # Load and preprocess the CSV data
-        logger.info(f"[cyan]Loading CSV file from {csv_file_path}...[/cyan]")
-        csv_data = pd.read_csv(csv_file_path)
-
-        # Standardize column names for matching
-        csv_data.rename(
-            columns={
-                "section":
-                "section",  # <-- CHANGED (only if CSV has lowercase column headers)
-                "topic": "topic",  # <-- CHANGED
-                "torah #": "torah_number",  # <-- CHANGED
-                "passage #": "passage_number",  # <-- CHANGED
-                "hebrew_text": "passage",  # <-- CHANGED
-                "translation": "english_translation",  # <-- CHANGED
-            },
-            inplace=True,
-        )
-
-        # Preprocess CSV data
-        for col in ["section", "topic", "torah_number",
-                    "passage_number"]:  # <-- CHANGED
-            csv_data[col] = csv_data[col].astype(str).str.strip()
-
-        # Ensure required columns exist
-        required_columns = [
-            "section",
-            "topic",
-            "torah_number",  # <-- CHANGED
-            "passage_number",  # <-- CHANGED
-            "passage",
-            "english_translation",
-        ]
-        for col in required_columns:
-            if col not in csv_data.columns:
-                raise ValueError(
-                    f"[ERROR] Missing required column '{col}' in the CSV file."
-                )
+        # Load and preprocess the CSV data (cached across runs)
+        csv_data = load_dataset(csv_file_path)
 
         # Initialize lists to hold queried results and errors
         matched_passages = []
@@ -270,14 +286,11 @@ def process_response_file_with_csv(input_json_path: Path, csv_file_path: Path,
                 )
 
                 # Search in the CSV
-                matched_row = csv_data[(csv_data["section"].str.strip(
-                ).str.lower() == section.lower()) & (
-                    csv_data["topic"].str.strip().str.lower() == topic.lower())
-                                       & (csv_data["torah_number"].astype(str)
-                                          == torah_number) &  # <-- CHANGED
-                                       (csv_data["passage_number"].astype(str)
-                                        == passage_number)  # <-- CHANGED
-                                       ]
+                matched_row = csv_data[
+                    (csv_data["section_key"] == section.lower())
+                    & (csv_data["topic_key"] == topic.lower())
+                    & (csv_data["torah_number"] == torah_number)
+                    & (csv_data["passage_number"] == passage_number)]
 
                 # Retry search if no match
                 if matched_row.empty:
@@ -362,10 +375,9 @@ def main(question_id=None):
             Panel.fit(
                 "[yellow]Step 2: Processing Latest Question Results[/yellow]"))
 
-        # Get the latest question ID from the manifest
-        question_id = get_latest_question_id()
-        logger.info(
-            f"[cyan]Processing latest question ID: {question_id}[/cyan]")
+        # Get latest question ID if not provided
+        question_id = question_id or get_latest_question_id()
+        logger.info(f"[cyan]Processing question ID: {question_id}[/cyan]")
 
         # Define paths
         question_folder = Path("data/answers") / question_id
@@ -10,6 +10,7 @@ See LICENSE.md for terms of use.
 """
 
 import json
+import orjson
 import os
 from pathlib import Path
 import logging
@@ -28,8 +29,10 @@ from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.traceback import install
 
-# Install rich traceback handler
-install(show_locals=True)
+# Install rich traceback handler in development only; show_locals makes every
+# traceback repr the locals of every frame
+if os.environ.get("QUART_ENV") == "development":
+    install(show_locals=True)
 
 # Initialize Rich console
 console = Console()
@@ -50,6 +53,10 @@ TARGET_PASSAGES = 15  # Desired number of passages to narrow down to
 MINIMUM_SCORE_THRESHOLD = 7.0  # Must meet/exceed 7.0 average score
 
 
+class NoMatchesError(Exception):
+    """No passage reached MINIMUM_SCORE_THRESHOLD, so there is nothing for step 4."""
+
+
 def get_latest_question_id() -> str:
     """Get the most recent question ID from the manifest file."""
     manifest_path = Path("data/manifest.json")
@@ -57,8 +64,7 @@ def get_latest_question_id() -> str:
         raise FileNotFoundError(
             "Manifest file not found. Please run step 1 first.")
 
-    with manifest_path.open("r", encoding="utf-8") as f:
-        manifest = json.load(f)
+    manifest = orjson.loads(manifest_path.read_bytes())
 
     if not manifest:
         raise ValueError("Manifest is empty. Please run step 1 first.")
@@ -300,8 +306,7 @@ def main(question_id=None):
                 f"[red]No queried_results.json found at {queried_results_path}[/red]"
             )
 
-        with queried_results_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = orjson.loads(queried_results_path.read_bytes())
 
         question = data.get("question")
         if not question:
@@ -408,19 +413,21 @@ def main(question_id=None):
                 logger.warning(
                     f"[yellow]No original data found for {ref}[/yellow]")
 
-        # Save or error
-        # if selected_passage_data:
+        # Save even an empty selection, so all_responses.json is kept for debugging
         output_file = save_final_results(question_id, question,
                                          selected_passage_data, all_responses)
+        if not selected_passage_data:
+            raise NoMatchesError(
+                f"No passages were selected with average score >= {MINIMUM_SCORE_THRESHOLD}"
+            )
         console.print(
             Panel.fit(
                 f"[green]Done! Saved {len(selected_passage_data)} results to {output_file}[/green]"
             ))
-        # else:
-        #     raise ValueError(
-        #         f"[red]No passages were selected with average score >= {MINIMUM_SCORE_THRESHOLD}[/red]"
-        #     )
 
+    except NoMatchesError:
+        # Not a failure: let callers report it instead of exiting
+        raise
     except Exception as e:
         logger.error(f"[red]An error occurred: {e}[/red]")
         console.print(
@@ -20,12 +20,13 @@ via any medium, is strictly prohibited.
 # step_4.py
 
 import json
+import orjson
 import os
 import time
 from pathlib import Path
 import logging
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from threading import Lock
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
@@ -36,8 +37,10 @@ from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.traceback import install
 
-# Install rich traceback handler
-install(show_locals=True)
+# Install rich traceback handler in development only; show_locals makes every
+# traceback repr the locals of every frame
+if os.environ.get("QUART_ENV") == "development":
+    install(show_locals=True)
 
 # Initialize Rich console
 console = Console()
@@ -62,8 +65,7 @@ def get_latest_question_id() -> str:
         raise FileNotFoundError(
             "Manifest file not found. Please run previous steps first.")
 
-    with manifest_path.open("r", encoding="utf-8") as f:
-        manifest = json.load(f)
+    manifest = orjson.loads(manifest_path.read_bytes())
 
     if not manifest:
         raise ValueError("Manifest is empty. Please run previous steps first.")
@@ -223,9 +225,13 @@ def process_passage(passage: Dict, question: str, passage_index: int) -> Dict:
         }
 
 
-def save_results(question: str, results: List[Dict],
-                 original_data: Dict) -> Path:
-    """Save the passages with their analyses in descending score order."""
+def save_results(question_id: str, question: str, results: List[Dict],
+                 original_data: Dict) -> Tuple[Path, Dict]:
+    """Save the passages with their analyses in descending score order.
+
+    Returns the output path and the saved analysis, so callers don't have to
+    read the file back.
+    """
     try:
         # Instead of using (section, topic, number), we reference the final 'reference'
         # from step_3 or the newly built 'source' in step_4
@@ -247,8 +253,7 @@ def save_results(question: str, results: List[Dict],
             "analyzed_passages": sorted_results
         }
 
-        step_4_folder = Path(
-            "data/answers") / get_latest_question_id() / "step_4"
+        step_4_folder = Path("data/answers") / question_id / "step_4"
         step_4_folder.mkdir(parents=True, exist_ok=True)
 
         output_file = step_4_folder / "passage_analysis.json"
@@ -257,7 +262,7 @@ def save_results(question: str, results: List[Dict],
                 json.dump(output_data, f, ensure_ascii=False, indent=4)
 
         logger.info(f"[green]Saved analysis to {output_file}[/green]")
-        return output_file
+        return output_file, output_data
 
     except Exception as e:
         logger.error(f"[red]Error saving results: {str(e)}[/red]")
@@ -293,8 +298,7 @@ def main(question_id=None):
                 f"[red]Final selections not found at {final_selections_path}[/red]"
             )
 
-        with final_selections_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = orjson.loads(final_selections_path.read_bytes())
 
         question = data.get("question")
         if not question:
@@ -335,11 +339,13 @@ def main(question_id=None):
             raise ValueError("[red]No results were generated[/red]")
 
         # Save final results
-        output_file = save_results(question, all_results, data)
+        output_file, analysis = save_results(question_id, question,
+                                             all_results, data)
         console.print(
             Panel.fit(
                 f"[green]Successfully processed and saved analysis to {output_file}[/green]"
             ))
+        return analysis
 
     except Exception as e:
         logger.error(f"[red]An error occurred: {e}[/red]")